@@ -2,13 +2,71 @@
 
 import os
 import time
-import random
+import logging
+import logging.handlers
+import argparse
+import queue
+import threading
 from datetime import datetime
+import numpy as np
 import pyarrow as pa
-from pyarrow import schema as arrow_schema
+import pyarrow.compute as pc
 from pyarrow.parquet import ParquetWriter
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+
+logger = logging.getLogger("logeagle")
+
+# Arrow types and schema shared by every handler and flush
+TIMESTAMP_TYPE = pa.timestamp('s')
+LINE_TYPE = pa.string()
+STREAM_TYPE = pa.dictionary(pa.int8(), pa.string())
+LOG_SCHEMA = pa.schema([
+    ('timestamp', TIMESTAMP_TYPE),
+    ('stream', STREAM_TYPE),
+    ('line', LINE_TYPE)
+])
+
+# Every log feeds one output file; the stream column records which log a row
+# came from as an index into this dictionary
+STREAMS = ('access', 'error')
+STREAM_DICTIONARY = pa.array(STREAMS, type=pa.string())
+
+# Writer-queue message asking the writer thread to start a new output file
+_ROTATE = object()
+
+# Vocabulary and bytes templates for generate_sample_logs; lines are formatted
+# straight to bytes so they can be appended to the line buffer as-is
+SAMPLE_COUNT = 10
+SAMPLE_PATHS = np.array([b"/", b"/api", b"/login", b"/dashboard", b"/static/main.css"])
+SAMPLE_METHODS = np.array([b"GET", b"POST", b"PUT", b"DELETE"])
+SAMPLE_STATUSES = np.array([200, 201, 404, 500])
+SAMPLE_LEVELS = np.array([b"error", b"warn", b"notice"])
+SAMPLE_MESSAGES = np.array([
+    b"Connection refused",
+    b"File not found",
+    b"Invalid request",
+    b"Database timeout",
+    b"Memory limit exceeded"
+])
+ACCESS_TEMPLATE = b'%d - 192.168.1.%d - - [%s +0000] "%s %s HTTP/1.1" %d %d'
+ERROR_TEMPLATE = b'%d - %s - %s'
+
+rng = np.random.default_rng()
+
+# Most bytes read from one log per pass; a larger backlog is drained over
+# the following polls
+MAX_READ_BYTES = 64 << 20
+
+# Seconds a renamed-away log must go without growing before it is closed.
+# logrotate renames the log and signals nginx, whose workers keep appending
+# to the old file until they reopen their logs.
+ROTATE_WAIT = 5
+
+# _read_new_data result when the log has nothing new
+_NO_DATA = (b'', np.empty(0, dtype=np.int64))
+
+# Buffer bytes each row costs beyond its text: an int64 timestamp and an
+# int32 line offset
+ROW_OVERHEAD = 8 + 4
 
 class Config:
     def __init__(self):
@@ -16,163 +74,586 @@ class Config:
         self.error_log = "/var/log/nginx/error.log"
         self.output_dir = os.path.expanduser("~/logeagle")
         self.rotation_interval = 3600  # 1 hour
-        self.batch_size = 100  # Number of logs to accumulate before writing
+        # Flush once either threshold is crossed. ~8192 rows / 256 KiB keeps a
+        # batch roughly L2-sized; erring small is much worse than erring large,
+        # since every flush pays Arrow/Parquet setup cost.
+        self.batch_size = 8192  # Number of logs to accumulate before writing
+        self.batch_bytes = 256 * 1024  # Buffered bytes (text plus per-row columns) before writing
+        self.row_group_size = 65536  # Rows per Parquet row group, spanning several batches
+        self.memory_cap = 256 << 20  # Arrow bytes the writer may hold before writing a row group early
+        self.poll_interval_ms = 250  # How often to check the logs for new data
 
         # Create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
 
-class LogFileHandler(FileSystemEventHandler):
-    def __init__(self, log_file: str, output_prefix: str, rotation_interval: int, log_type: str):
+class LogFileHandler:
+    # The poll loop touches these on every pass; slots skip the instance dict
+    __slots__ = ('log_file', 'last_position', 'log_type', 'stream_id', 'writer',
+                 'batch_size', 'batch_bytes', 'ts_buf', 'line_values',
+                 'line_offsets', 'rows', '_fd', '_inode', '_tail', '_old_fd',
+                 '_old_position', '_old_tail', '_old_quiet_since', '_sampled',
+                 '_error', '_lock')
+
+    def __init__(self, log_file: str, log_type: str, writer: 'UnifiedLogWriter',
+                 batch_size: int, batch_bytes: int):
         self.log_file = log_file
-        self.output_prefix = output_prefix
         self.last_position = 0
-        self.schema = arrow_schema([
-            ('timestamp', pa.timestamp('s')),
-            ('line', pa.string())
-        ])
-        self.writer = None
-        self.rotation_interval = rotation_interval
-        self.last_rotation_time = time.time()
         self.log_type = log_type
-        self.buffer = []
-
-    def on_modified(self, event):
-        if event.src_path == self.log_file:
-            self.process_new_lines()
+        self.stream_id = STREAMS.index(log_type)
+        self.writer = writer
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self._reset_buffers()
+        self._fd = None
+        self._inode = None
+        # Trailing partial line, held until its newline arrives
+        self._tail = b''
+        # The previous file after a rename, still drained alongside the new
+        # one until it stops growing
+        self._old_fd = None
+        self._old_position = 0
+        self._old_tail = b''
+        self._old_quiet_since = 0.0
+        # Sample logs stand in for a missing log once, not on every poll
+        self._sampled = False
+        # Last error reported, so a persistent failure is logged once rather
+        # than on every poll
+        self._error = None
+        # Guards the buffers between the poll loop and rotation timer threads
+        self._lock = threading.RLock()
+        writer.register(self)
 
     def process_new_lines(self):
         try:
-            if not os.path.exists(self.log_file):
-                self.generate_sample_logs()
-                return
+            with self._lock:
+                # One timestamp stamps every line read in this pass
+                now = int(time.time())
+                new_data = self._read_new_data()
+                if new_data is None:
+                    if not self._sampled:
+                        self.generate_sample_logs()
+                        self._sampled = True
+                else:
+                    self._buffer_new_data(new_data, now)
 
-            with open(self.log_file, 'r') as file:
-                file.seek(self.last_position)
-                for line in file:
-                    self.buffer_line(line.strip())
-                self.last_position = file.tell()
+        except Exception as e:
+            message = str(e)
+            if message != self._error:
+                logger.error("Error processing %s: %s", self.log_file, e)
+                self._error = message
+        else:
+            if self._error is not None:
+                logger.info("Processing %s again", self.log_file)
+                self._error = None
+
+    def _buffer_new_data(self, new_data, now: int):
+        """Buffer one read pass, flushing whenever a batch fills up"""
+        # Buffer the pass in slices that end exactly where a batch fills up,
+        # so there is no per-line Python work
+        data, ends = new_data
+        costs = ends + ROW_OVERHEAD * np.arange(1, len(ends) + 1)
+        start = 0
+        while start < len(ends):
+            consumed = int(ends[start - 1]) if start else 0
+            consumed_cost = int(costs[start - 1]) if start else 0
+            room_bytes = self.batch_bytes - self.buffered_bytes
+            # Include the line that crosses the byte budget, as a per-line
+            # check would
+            stop = int(np.searchsorted(costs, consumed_cost + room_bytes)) + 1
+            stop = max(start + 1, min(stop, start + self.batch_size - self.rows, len(ends)))
+            self._append(data[consumed:ends[stop - 1]], ends[start:stop] - consumed, now)
+            start = stop
 
             # Write buffer if it's full
-            if len(self.buffer) >= config.batch_size:
+            if self.rows >= self.batch_size or self.buffered_bytes >= self.batch_bytes:
                 self.flush_buffer()
 
-        except Exception as e:
-            print(f"Error processing {self.log_file}: {e}")
+    def _read_new_data(self):
+        """Drain newly appended complete lines from the log
 
-    def buffer_line(self, line: str):
-        if line:
-            current_time = int(time.time())
-            self.buffer.append((current_time, line))
+        Returns the raw bytes and a numpy array of each line's end offset
+        (just past its newline), or None if the log does not exist and was
+        never opened.
+        """
+        # A single stat both detects rotation/truncation and, on idle polls,
+        # shows there is nothing new to read
+        try:
+            path_stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            path_stat = None
 
-    def flush_buffer(self):
-        if not self.buffer:
-            return
+        parts = []
+        if self._fd is not None and path_stat is not None:
+            if path_stat.st_ino != self._inode:
+                # Renamed away by logrotate. The old descriptor is kept and
+                # drained alongside the new path, since nginx writes to it
+                # until its workers reopen their logs
+                if self._old_fd is not None:
+                    parts.append(self._drain_rotated(final=True))
+                self._old_fd = self._fd
+                self._old_position = self.last_position
+                self._old_tail = self._tail
+                self._old_quiet_since = time.monotonic()
+                self._fd = None
+                self._tail = b''
+                self.last_position = 0
+            elif path_stat.st_size < self.last_position:
+                # Truncated in place; the partial line went with it
+                os.close(self._fd)
+                self._fd = None
+                self._tail = b''
+                self.last_position = 0
 
-        try:
-            if self.writer is None or self._should_rotate():
-                self._rotate_file()
+        # Lines from the old file come first, as they were written first
+        if self._old_fd is not None:
+            parts.append(self._drain_rotated())
+        current = self._read_current(path_stat)
+        if current is not None:
+            parts.append(current)
 
-            table = pa.Table.from_arrays(
-                [
-                    pa.array([row[0] for row in self.buffer], type=pa.timestamp('s')),
-                    pa.array([row[1] for row in self.buffer], type=pa.string())
-                ],
-                schema=self.schema
-            )
+        parts = [part for part in parts if len(part[1])]
+        if not parts:
+            return None if current is None else _NO_DATA
+        if len(parts) == 1:
+            return parts[0]
+        data = b''.join(part[0] for part in parts)
+        ends = []
+        offset = 0
+        for part_data, part_ends in parts:
+            ends.append(part_ends + offset)
+            offset += len(part_data)
+        return data, np.concatenate(ends)
 
-            self.writer.write_table(table)
-            print(f"Wrote {len(self.buffer)} logs to {self.output_prefix}")
-            self.buffer.clear()
+    def _read_current(self, path_stat):
+        """Read new complete lines from the file currently at the log path"""
+        if self._fd is not None and path_stat is not None and path_stat.st_size == self.last_position:
+            return _NO_DATA
 
-        except Exception as e:
-            print(f"Error writing to Parquet file: {e}")
+        if self._fd is None:
+            if path_stat is None:
+                return None
+            self._fd = os.open(self.log_file, os.O_RDONLY | os.O_NONBLOCK)
+            self._inode = os.fstat(self._fd).st_ino
+
+        # The stat already says how much is new, so one positioned read
+        # fetches it all without a trailing read() to detect EOF
+        size = path_stat.st_size if path_stat is not None else os.fstat(self._fd).st_size
+        want = min(size - self.last_position, MAX_READ_BYTES)
+        if want <= 0:
+            return _NO_DATA
+        chunk = os.pread(self._fd, want, self.last_position)
+        if not chunk:
+            return _NO_DATA
+        self.last_position += len(chunk)
+        data, ends, self._tail = self._split_lines(self._tail, chunk)
+        return data, ends
+
+    def _drain_rotated(self, final: bool = False):
+        """Read new complete lines from the renamed-away log
+
+        Once it has not grown for ROTATE_WAIT seconds (or with final set, when
+        the log is rotated again) the rest is read, an unterminated last line
+        is kept as a line of its own, and the descriptor is closed.
+        """
+        now = time.monotonic()
+        size = os.fstat(self._old_fd).st_size
+        if size > self._old_position:
+            self._old_quiet_since = now
+        elif now - self._old_quiet_since >= ROTATE_WAIT:
+            final = True
+
+        chunks = []
+        while size > self._old_position:
+            want = min(size - self._old_position, MAX_READ_BYTES)
+            chunk = os.pread(self._old_fd, want, self._old_position)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self._old_position += len(chunk)
+            if not final:
+                # A larger backlog is drained over the following polls
+                break
+
+        data, ends, self._old_tail = self._split_lines(self._old_tail, b''.join(chunks), final)
+        if final:
+            os.close(self._old_fd)
+            self._old_fd = None
+        return data, ends
+
+    @staticmethod
+    def _split_lines(tail: bytes, chunk: bytes, final: bool = False):
+        """Join chunk onto the held partial line and find each line's end
+
+        Returns the complete lines, their end offsets and the new partial
+        line. With final set the file gets no more writes, so an unterminated
+        last line is complete rather than held for the next pass.
+        """
+        data = tail + chunk
+        if final and data and not data.endswith(b'\n'):
+            data += b'\n'
+        # Keep a partial last line for the next pass
+        end = data.rfind(b'\n') + 1
+        tail = data[end:]
+        data = memoryview(data)[:end]
+        # Vectorized newline scan; lines stay in the read buffer with their
+        # terminators, which the writer trims in Arrow
+        ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 0x0A) + 1
+        return data, ends, tail
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            if self._old_fd is not None:
+                os.close(self._old_fd)
+                self._old_fd = None
+
+    def _reset_buffers(self):
+        # Columns are kept in Arrow's own layout (int64 seconds, and one values
+        # buffer plus int32 offsets for lines) so flushes wrap them without
+        # per-row conversion. The fixed-width buffers are sized for a full
+        # batch up front and filled in slices through the self.rows cursor, so
+        # they never regrow while a batch accumulates.
+        self.ts_buf = np.empty(self.batch_size, dtype=np.int64)
+        self.line_values = bytearray()
+        self.line_offsets = np.zeros(self.batch_size + 1, dtype=np.int32)
+        self.rows = 0
+
+    def _append(self, values, ends: np.ndarray, timestamp: int):
+        """Append lines laid out back to back in values, ending at the given offsets"""
+        start, end = self.rows, self.rows + len(ends)
+        if end > len(self.ts_buf):
+            # Only an oversized buffer_lines call can overrun a batch
+            extra = end - len(self.ts_buf)
+            self.ts_buf = np.concatenate([self.ts_buf, np.empty(extra, dtype=np.int64)])
+            self.line_offsets = np.concatenate([self.line_offsets, np.empty(extra, dtype=np.int32)])
+        self.ts_buf[start:end] = timestamp
+        self.line_offsets[start + 1:end + 1] = ends + len(self.line_values)
+        self.line_values += values
+        self.rows = end
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Memory held by the current batch, measured against batch_bytes"""
+        return len(self.line_values) + ROW_OVERHEAD * self.rows
+
+    def buffer_lines(self, lines: list, timestamp: int):
+        """Append a batch of lines that share one timestamp"""
+        # One concatenation and one offsets write for the whole batch
+        ends = np.cumsum(np.fromiter(map(len, lines), dtype=np.int64, count=len(lines)))
+        self._append(b''.join(lines), ends, timestamp)
+
+    def flush_buffer(self):
+        with self._lock:
+            if not self.rows:
+                return
+
+            # Hand the full buffers to the writer thread and start fresh ones
+            self.writer.submit(self.stream_id, self.rows, self.ts_buf, self.line_values, self.line_offsets)
+            self._reset_buffers()
 
     def generate_sample_logs(self):
         """Generate sample logs for testing when log files don't exist"""
         current_time = int(time.time())
-        
+        n = SAMPLE_COUNT
+
+        # Draw every random field for the whole batch up front
         if self.log_type == 'access':
-            ips = [f"192.168.1.{random.randint(1, 255)}" for _ in range(5)]
-            paths = ["/", "/api", "/login", "/dashboard", "/static/main.css"]
-            methods = ["GET", "POST", "PUT", "DELETE"]
-            
-            for _ in range(10):
-                log = (
-                    f'{current_time} - {random.choice(ips)} - - '
-                    f'[{datetime.now().strftime("%d/%b/%Y:%H:%M:%S")} +0000] '
-                    f'"{random.choice(methods)} {random.choice(paths)} HTTP/1.1" '
-                    f'{random.choice([200, 201, 404, 500])} {random.randint(100, 5000)}'
+            stamp = datetime.now().strftime("%d/%b/%Y:%H:%M:%S").encode()
+            logs = [
+                ACCESS_TEMPLATE % (current_time, ip, stamp, method, path, status, size)
+                for ip, method, path, status, size in zip(
+                    rng.integers(1, 256, size=n).tolist(),
+                    rng.choice(SAMPLE_METHODS, size=n).tolist(),
+                    rng.choice(SAMPLE_PATHS, size=n).tolist(),
+                    rng.choice(SAMPLE_STATUSES, size=n).tolist(),
+                    rng.integers(100, 5001, size=n).tolist()
                 )
-                self.buffer_line(log)
+            ]
         else:
-            levels = ["error", "warn", "notice"]
-            messages = [
-                "Connection refused",
-                "File not found",
-                "Invalid request",
-                "Database timeout",
-                "Memory limit exceeded"
+            logs = [
+                ERROR_TEMPLATE % (current_time, level, message)
+                for level, message in zip(
+                    rng.choice(SAMPLE_LEVELS, size=n).tolist(),
+                    rng.choice(SAMPLE_MESSAGES, size=n).tolist()
+                )
             ]
-            
-            for _ in range(10):
-                log = f'{current_time} - {random.choice(levels)} - {random.choice(messages)}'
-                self.buffer_line(log)
 
+        self.buffer_lines(logs, current_time)
         self.flush_buffer()
 
-    def _should_rotate(self) -> bool:
-        return time.time() - self.last_rotation_time >= self.rotation_interval
+class UnifiedLogWriter:
+    """Writes batches from every LogFileHandler into one rotating Parquet file"""
+
+    def __init__(self, output_prefix: str, rotation_interval: int, batch_size: int,
+                 row_group_size: int, memory_cap: int):
+        self.output_prefix = output_prefix
+        self.schema = LOG_SCHEMA
+        self.writer = None
+        self.rows_written = 0
+        self.rotation_interval = rotation_interval
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size
+        self.memory_cap = memory_cap
+        self.handlers = []
+        # Arrow allocations made by the writer thread are counted separately,
+        # so pending row groups can be bounded by memory as well as rows
+        self._pool = pa.proxy_memory_pool(pa.default_memory_pool())
+        # Encoded batches waiting to be written as one row group (writer thread only)
+        self._pending = []
+        self._pending_rows = 0
+        self._rotation_timer = None
+        self._rotation_deadline = None
+        # Guards the rotation timer against close()
+        self._lock = threading.Lock()
+        # Full buffers are encoded and written on a dedicated thread so Parquet
+        # encoding never stalls the poll loop
+        self._q = queue.Queue(maxsize=16)
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
+
+    def register(self, handler: LogFileHandler):
+        self.handlers.append(handler)
+
+    def submit(self, stream_id: int, rows: int, ts_buf: np.ndarray, line_values: bytearray,
+               line_offsets: np.ndarray):
+        """Queue the first rows of one handler's buffers; blocks when the queue is full"""
+        self._q.put((stream_id, rows, ts_buf, line_values, line_offsets))
+
+    def start_rotation_timer(self):
+        """Rotate the output file every rotation_interval seconds"""
+        # Ticks are scheduled against a fixed deadline so time spent flushing
+        # doesn't accumulate as drift between rotations. The deadline lives
+        # on the monotonic clock, so wall-clock steps (NTP, DST) cannot shorten
+        # or stretch an interval
+        now = time.monotonic()
+        if self._rotation_deadline is None:
+            self._rotation_deadline = now
+        self._rotation_deadline += self.rotation_interval
+        delay = max(0.0, self._rotation_deadline - now)
+        self._rotation_timer = threading.Timer(delay, self._on_rotation_timer)
+        self._rotation_timer.daemon = True
+        self._rotation_timer.start()
+
+    def _on_rotation_timer(self):
+        with self._lock:
+            if self._rotation_timer is None:
+                return  # closed while this tick was pending
+            for handler in self.handlers:
+                handler.flush_buffer()
+            self._q.put(_ROTATE)
+            self.start_rotation_timer()
+
+    def close(self):
+        with self._lock:
+            if self._rotation_timer is not None:
+                self._rotation_timer.cancel()
+                self._rotation_timer = None
+            if self._writer_thread is not None:
+                # Let the writer drain queued batches, then close the file
+                self._q.put(None)
+                self._writer_thread.join()
+                self._writer_thread = None
+
+    def _writer_loop(self):
+        while True:
+            item = self._q.get()
+            if item is None:
+                break
+            if item is _ROTATE:
+                self._rotate_file()
+                continue
+
+            stream_id, rows, ts_buf, line_values, line_offsets = item
+            try:
+                batch = pa.RecordBatch.from_arrays(
+                    [
+                        pa.Array.from_buffers(TIMESTAMP_TYPE, rows, [None, pa.py_buffer(ts_buf)]),
+                        self._build_stream_array(stream_id, rows),
+                        self._build_line_array(rows, line_values, line_offsets)
+                    ],
+                    schema=self.schema
+                )
+                # Drop lines that were blank or whitespace-only
+                lengths = pc.binary_length(batch.column(2), memory_pool=self._pool)
+                batch = pc.filter(batch, pc.greater(lengths, 0, memory_pool=self._pool),
+                                  memory_pool=self._pool)
+            except Exception as e:
+                logger.error("Error building batch for %s: %s", STREAMS[stream_id], e)
+                continue
+            if not batch.num_rows:
+                continue
+
+            # ParquetWriter closes a row group on every write call, so batches
+            # are held until they add up to a full row group, or until long
+            # lines push held memory past memory_cap
+            self._pending.append(batch)
+            self._pending_rows += batch.num_rows
+            while self._pending_rows >= self.row_group_size:
+                self._write_row_group(self.row_group_size)
+            if self._pool.bytes_allocated() >= self.memory_cap:
+                self._write_row_group()
+
+        self._rotate_file()
+
+    def _write_row_group(self, rows=None):
+        """Write the first rows pending rows (all of them by default) as one row group"""
+        if not self._pending:
+            return
+
+        table = pa.Table.from_batches(self._pending, schema=self.schema)
+        if rows is not None and rows < table.num_rows:
+            # Batches rarely add up to exactly row_group_size rows; the
+            # overshoot waits for the next group instead of becoming a tiny one
+            self._pending = table.slice(rows).to_batches()
+            table = table.slice(0, rows)
+        else:
+            self._pending = []
+        self._pending_rows -= table.num_rows
+
+        try:
+            if self.writer is None:
+                self._open_writer()
+
+            self.writer.write_table(table, row_group_size=table.num_rows)
+            self.rows_written += table.num_rows
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Wrote %d logs to %s", table.num_rows, self.output_prefix)
+
+        except Exception as e:
+            logger.error("Error writing to Parquet file: %s", e)
+
+    @staticmethod
+    def _build_stream_array(stream_id: int, length: int) -> pa.Array:
+        """Tag a whole batch with one stream via a constant int8 index buffer"""
+        indices = pa.Array.from_buffers(pa.int8(), length, [None, pa.py_buffer(bytes([stream_id]) * length)])
+        return pa.DictionaryArray.from_arrays(indices, STREAM_DICTIONARY)
+
+    def _build_line_array(self, rows: int, values: bytearray, offsets: np.ndarray) -> pa.Array:
+        """Wrap the raw line buffers as an Arrow string array and trim surrounding whitespace"""
+        lines = pa.Array.from_buffers(
+            pa.binary(),
+            rows,
+            [None, pa.py_buffer(offsets), pa.py_buffer(values)]
+        )
+        try:
+            # Validates UTF-8 without copying the data
+            lines = lines.cast(LINE_TYPE, memory_pool=self._pool)
+        except pa.ArrowInvalid:
+            lines = pa.array(
+                [line.decode('utf-8', 'replace') for line in lines.to_pylist()],
+                type=LINE_TYPE,
+                memory_pool=self._pool
+            )
+        # Same result as str.strip() per line, in one kernel over the buffer
+        return pc.utf8_trim_whitespace(lines, memory_pool=self._pool)
 
     def _rotate_file(self):
+        # Close the current file; the next flush opens a fresh one, so idle
+        # logs don't leave empty Parquet files behind
+        self._write_row_group()
         if self.writer:
-            self.writer.close()
+            # A failed close must not kill the writer thread, or submit()
+            # would block forever once the queue fills
+            try:
+                self.writer.close()
+                # One summary per file instead of a line per flush
+                logger.info("Closed output file for %s after %d logs", self.output_prefix, self.rows_written)
+            except Exception as e:
+                logger.error("Error closing Parquet file: %s", e)
+            self.writer = None
 
+    def _open_writer(self):
         timestamp = time.strftime("%Y%m%d-%H%M%S")
         new_output_file = f"{self.output_prefix}.{timestamp}.parquet"
-        self.writer = ParquetWriter(new_output_file, self.schema)
-        self.last_rotation_time = time.time()
-        print(f"Rotated to new file: {new_output_file}")
+        # Log lines are highly repetitive, so dictionary encoding plus ZSTD
+        # shrinks output a lot for a little CPU (use 'lz4' if CPU-bound).
+        # Timestamps are dictionary-encoded too, since a whole read pass
+        # shares one. Page batches are aligned with buffer flushes.
+        self.writer = ParquetWriter(
+            new_output_file,
+            self.schema,
+            compression='zstd',
+            compression_level=3,
+            use_dictionary=True,
+            data_page_size=1 << 20,
+            dictionary_pagesize_limit=1 << 20,
+            write_statistics=True,
+            write_batch_size=self.batch_size,
+            memory_pool=self._pool
+        )
+        self.rows_written = 0
+        logger.info("Opened new file: %s", new_output_file)
 
 def main():
+    parser = argparse.ArgumentParser(description="Tail nginx logs into rotating Parquet files")
+    parser.add_argument("--debug", action="store_true", help="Log every Parquet write")
+    args = parser.parse_args()
+
+    # Records are formatted and written to the console on a listener thread,
+    # so logging from the poll loop or writer thread never blocks on I/O
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, console)
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG if args.debug else logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+
     config = Config()
-    observer = Observer()
+
+    # Both logs feed one Parquet file, tagged by the stream column
+    writer = UnifiedLogWriter(
+        os.path.join(config.output_dir, "nginx"),
+        config.rotation_interval,
+        config.batch_size,
+        config.row_group_size,
+        config.memory_cap
+    )
 
     # Set up handlers for both access and error logs
     access_handler = LogFileHandler(
         config.access_log,
-        os.path.join(config.output_dir, "access"),
-        config.rotation_interval,
-        'access'
+        'access',
+        writer,
+        config.batch_size,
+        config.batch_bytes
     )
     
     error_handler = LogFileHandler(
         config.error_log,
-        os.path.join(config.output_dir, "error"),
-        config.rotation_interval,
-        'error'
+        'error',
+        writer,
+        config.batch_size,
+        config.batch_bytes
     )
 
-    # Schedule monitoring for both log files
-    observer.schedule(access_handler, path=os.path.dirname(config.access_log), recursive=False)
-    observer.schedule(error_handler, path=os.path.dirname(config.error_log), recursive=False)
+    logger.info("Starting log monitoring. Output directory: %s", config.output_dir)
+    writer.start_rotation_timer()
 
-    print(f"Starting log monitoring. Output directory: {config.output_dir}")
-    observer.start()
+    # Busy logs always have data waiting at the next tick, so a short poll
+    # beats per-write inotify events; idle ticks cost one stat per log
+    handlers = [access_handler, error_handler]
+    poll_interval = config.poll_interval_ms / 1000
 
     try:
         while True:
-            time.sleep(10)  # Check for changes every 10 seconds
-            access_handler.process_new_lines()
-            error_handler.process_new_lines()
+            for handler in handlers:
+                handler.process_new_lines()
+            time.sleep(poll_interval)
     except KeyboardInterrupt:
-        print("\nStopping log monitoring...")
-        observer.stop()
+        logger.info("Stopping log monitoring...")
     finally:
         # Flush any remaining logs before shutting down
         access_handler.flush_buffer()
         error_handler.flush_buffer()
-        observer.join()
-        print("Log monitoring stopped.")
+        access_handler.close()
+        error_handler.close()
+        writer.close()
+        logger.info("Log monitoring stopped.")
+        listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file